@@ -3,7 +3,13 @@
 """
 import csv
 import sys
+from collections import Counter
+from operator import itemgetter
 from pathlib import Path
+from queue import Empty, Queue
+from threading import Event, Thread
+from typing import Iterator, List, Optional
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
 
 # Добавляем корневую директорию в путь
@@ -11,78 +17,180 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from app.models import Term, Link, SessionLocal, init_db
 
+# Размер пакета строк для записи в БД (ограничивает потребление памяти на больших CSV)
+BATCH_SIZE = 5000
 
-def import_terms(csv_path: str, db: Session):
-    """Импорт терминов из CSV"""
-    # Определяем типы узлов
-    def get_node_type(term_name: str) -> str:
-        if term_name == 'Подход к разработке интерфейса':
-            return 'root'
-        elif term_name in ['Классическая разработка UI', 'Backend-Driven UI']:
-            return 'approach'
-        else:
-            return 'term'
+# Типы узлов графа; все остальные термины имеют тип 'term'
+NODE_TYPE_MAP = {
+    'Подход к разработке интерфейса': 'root',
+    'Классическая разработка UI': 'approach',
+    'Backend-Driven UI': 'approach',
+}
+
+
+def iter_batches(rows: Iterator[dict], batch_size: Optional[int] = None) -> Iterator[List[dict]]:
+    """Разбор строк в фоновом потоке: пока БД записывает пакет, следующий уже готовится
+    
+    Args:
+        rows: Генератор строк для вставки (выполняется в фоновом потоке)
+        batch_size: Размер пакета (по умолчанию BATCH_SIZE)
+    """
+    batch_size = batch_size or BATCH_SIZE
+    queue = Queue(maxsize=4)
+    stop = Event()
+    
+    def produce():
+        batch = []
+        try:
+            for row in rows:
+                if stop.is_set():
+                    return
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    queue.put(batch)
+                    batch = []
+            if batch:
+                queue.put(batch)
+        except Exception as e:
+            queue.put(e)
+        finally:
+            queue.put(None)
     
-    with open(csv_path, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
+    producer = Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while (item := queue.get()) is not None:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # Если запись в БД упала, останавливаем и разблокируем поток-производитель
+        stop.set()
+        while producer.is_alive():
+            try:
+                queue.get_nowait()
+            except Empty:
+                producer.join(0.05)
+
+
+def read_csv(csv_path: str, *columns: str) -> Iterator[tuple]:
+    """Построчное чтение CSV: кортежи значений указанных колонок (не меньше двух)"""
+    with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        get_columns = itemgetter(*(header.index(column) for column in columns))
         for row in reader:
-            # Проверяем, существует ли термин
-            existing = db.query(Term).filter(Term.term == row['term']).first()
-            node_type = get_node_type(row['term'])
-            if not existing:
-                term = Term(term=row['term'], definition=row['definition'], node_type=node_type)
-                db.add(term)
-                print(f"Добавлен термин: {row['term']} (тип: {node_type})")
-            else:
-                # Обновляем определение и тип, если они изменились
-                updated = False
-                if existing.definition != row['definition']:
-                    existing.definition = row['definition']
-                    updated = True
-                    print(f"Обновлено определение термина: {row['term']}")
-                if existing.node_type != node_type:
-                    existing.node_type = node_type
-                    updated = True
-                    print(f"Обновлен тип термина: {row['term']} -> {node_type}")
-                if not updated:
-                    print(f"Термин уже актуален: {row['term']}")
-    db.commit()
+            yield get_columns(row)
+
+
+def import_terms(csv_path: str, db: Session):
+    """Импорт терминов из CSV (без коммита, транзакцией управляет вызывающий код)"""
+    def parse_rows():
+        for term_name, definition in read_csv(csv_path, 'term', 'definition'):
+            yield {
+                'term': term_name,
+                'definition': definition,
+                'node_type': NODE_TYPE_MAP.get(term_name, 'term')
+            }
+    
+    total = 0
+    for batch in iter_batches(parse_rows()):
+        # Вставка или обновление одним запросом: конфликт по уникальному term решает сама БД
+        stmt = sqlite_insert(Term).values(batch)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Term.term],
+            set_={'definition': stmt.excluded.definition, 'node_type': stmt.excluded.node_type},
+            where=(Term.definition != stmt.excluded.definition) | (Term.node_type != stmt.excluded.node_type)
+        )
+        db.execute(stmt)
+        total += len(batch)
+    print(f"Обработано терминов: {total}")
 
 
 def import_links(csv_path: str, db: Session):
-    """Импорт связей из CSV"""
-    with open(csv_path, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
+    """Импорт связей из CSV (без коммита, транзакцией управляет вызывающий код)"""
+    # Загружаем термины и существующие связи заранее, чтобы не делать запросы на каждую строку
+    term_ids = dict(db.query(Term.term, Term.id).all())
+    existing_links = {tuple(row) for row in db.query(Link.source_id, Link.target_id, Link.relation).all()}
+    
+    counts = Counter()
+    
+    def parse_rows():
+        for source, target, relation in read_csv(csv_path, 'source', 'target', 'relation'):
             # Находим термины
-            source_term = db.query(Term).filter(Term.term == row['source']).first()
-            target_term = db.query(Term).filter(Term.term == row['target']).first()
+            source_id = term_ids.get(source)
+            target_id = term_ids.get(target)
             
-            if not source_term:
-                print(f"Предупреждение: исходный термин '{row['source']}' не найден")
+            if source_id is None:
+                print(f"Предупреждение: исходный термин '{source}' не найден")
+                counts['skipped'] += 1
                 continue
-            if not target_term:
-                print(f"Предупреждение: целевой термин '{row['target']}' не найден")
+            if target_id is None:
+                print(f"Предупреждение: целевой термин '{target}' не найден")
+                counts['skipped'] += 1
                 continue
             
             # Проверяем, существует ли связь
-            existing = db.query(Link).filter(
-                Link.source_id == source_term.id,
-                Link.target_id == target_term.id,
-                Link.relation == row['relation']
-            ).first()
-            
-            if not existing:
-                link = Link(
-                    source_id=source_term.id,
-                    target_id=target_term.id,
-                    relation=row['relation']
-                )
-                db.add(link)
-                print(f"Добавлена связь: {row['source']} -> {row['target']} ({row['relation']})")
-            else:
-                print(f"Связь уже существует: {row['source']} -> {row['target']}")
-    db.commit()
+            key = (source_id, target_id, relation)
+            if key in existing_links:
+                counts['existing'] += 1
+                continue
+            existing_links.add(key)
+            counts['added'] += 1
+            yield {'source_id': source_id, 'target_id': target_id, 'relation': relation}
+    
+    for batch in iter_batches(parse_rows()):
+        db.bulk_insert_mappings(Link, batch)
+    print(
+        f"Связей добавлено: {counts['added']}, уже существовало: {counts['existing']}, "
+        f"пропущено: {counts['skipped']}"
+    )
+
+
+def fast_import_terms(csv_path: str, db: Session):
+    """Импорт терминов в пустую БД через executemany драйвера sqlite3 (без коммита)
+    
+    Выполняется на соединении сессии, поэтому остается в ее транзакции.
+    """
+    rows = (
+        (term_name, definition, NODE_TYPE_MAP.get(term_name, 'term'))
+        for term_name, definition in read_csv(csv_path, 'term', 'definition')
+    )
+    cursor = db.connection().connection.dbapi_connection.cursor()
+    try:
+        cursor.executemany(
+            'INSERT INTO terms (term, definition, node_type) VALUES (?, ?, ?) '
+            'ON CONFLICT (term) DO UPDATE SET definition = excluded.definition, node_type = excluded.node_type',
+            rows
+        )
+        print(f"Обработано терминов: {cursor.rowcount}")
+    finally:
+        cursor.close()
+
+
+def fast_import_links(csv_path: str, db: Session):
+    """Импорт связей в пустую БД через executemany драйвера sqlite3 (без коммита)
+    
+    Термины сопоставляются по названию прямо в SQL; строки с ненайденными терминами
+    и дубликаты пропускаются.
+    """
+    counts = Counter()
+    
+    def parse_rows():
+        for source, target, relation in read_csv(csv_path, 'source', 'target', 'relation'):
+            counts['total'] += 1
+            yield relation, source, target
+    
+    cursor = db.connection().connection.dbapi_connection.cursor()
+    try:
+        cursor.executemany(
+            'INSERT OR IGNORE INTO links (source_id, target_id, relation) '
+            'SELECT s.id, t.id, ? FROM terms s, terms t WHERE s.term = ? AND t.term = ?',
+            parse_rows()
+        )
+        print(f"Связей добавлено: {cursor.rowcount}, пропущено: {counts['total'] - cursor.rowcount}")
+    finally:
+        cursor.close()
 
 
 def main(reset: bool = False):
@@ -106,21 +214,25 @@ def main(reset: bool = False):
             print("Очистка базы данных...")
             db.query(Link).delete()
             db.query(Term).delete()
-            db.commit()
             print("База данных очищена")
         
+        # Пустую БД (первый запуск или reset) заполняем быстрым путем через executemany
+        fast_path = db.query(Term.id).first() is None
+        
         print("Импорт терминов...")
         if terms_csv.exists():
-            import_terms(str(terms_csv), db)
+            (fast_import_terms if fast_path else import_terms)(str(terms_csv), db)
         else:
             print(f"Файл {terms_csv} не найден")
         
         print("\nИмпорт связей...")
         if links_csv.exists():
-            import_links(str(links_csv), db)
+            (fast_import_links if fast_path else import_links)(str(links_csv), db)
         else:
             print(f"Файл {links_csv} не найден")
         
+        # Очистка и импорт фиксируются одной транзакцией
+        db.commit()
         print("\nИмпорт завершен!")
     except Exception as e:
         print(f"Ошибка при импорте: {e}")
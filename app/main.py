@@ -1,26 +1,65 @@
 """
 FastAPI приложение для глоссария терминов Backend-Driven UI
 """
+import os
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from pathlib import Path
-from fastapi import FastAPI, Depends, HTTPException, status
+from threading import Lock
+import orjson
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
-from sqlalchemy.orm import Session
-from typing import List
-
-from app.models import Term, Link, get_db, init_db
+from fastapi.responses import HTMLResponse, ORJSONResponse, Response
+from sqlalchemy import exists, select, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, aliased
+from typing import Any, Callable, List, Optional
+
+from app.models import (
+    Term, Link, SCHEMA_VERSION, SessionLocal, engine,
+    get_db, get_schema_version, init_db, set_schema_version
+)
 from app.schemas import (
-    TermCreate, TermUpdate, TermResponse,
+    TermCreate, TermUpdate, TermResponse, TermSummary,
     LinkCreate, LinkResponse,
-    GraphResponse, GraphNode, GraphEdge
+    GraphResponse
 )
 
+
+# Инициализация БД при старте
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Инициализация БД при старте приложения"""
+    # Схема уже актуальна - пропускаем миграции и проверку данных
+    if get_schema_version() != SCHEMA_VERSION:
+        init_db()
+        # Импорт данных из CSV при первом запуске (если база пустая)
+        db = SessionLocal()
+        try:
+            term_count = db.query(Term).count()
+            if term_count == 0:
+                from app.import_data import main as import_main
+                import_main()
+        finally:
+            db.close()
+        set_schema_version()
+    
+    # Обновляем статистику для планировщика запросов SQLite
+    with engine.begin() as conn:
+        conn.exec_driver_sql("PRAGMA optimize")
+    yield
+
+
 # Инициализация приложения
 app = FastAPI(
     title="Глоссарий Backend-Driven UI",
     description="API для управления глоссарием терминов по теме Backend-Driven UI",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    # Сериализация ответов через orjson вместо стандартного json
+    default_response_class=ORJSONResponse
 )
 
 # Настройка CORS для фронтенда
@@ -30,80 +69,167 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Last-Id"],
 )
 
 # Подключение статических файлов
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-# Инициализация БД при старте
-@app.on_event("startup")
-async def startup_event():
-    init_db()
-    # Импорт данных из CSV при первом запуске (если база пустая)
-    from app.models import SessionLocal, Term
-    db = SessionLocal()
-    try:
-        term_count = db.query(Term).count()
-        if term_count == 0:
-            from app.import_data import main as import_main
-            import_main()
-    finally:
-        db.close()
+# Кэш ответов на чтение в памяти процесса. Ключ включает версию данных, которая
+# увеличивается при любом изменении терминов или связей
+RESPONSE_CACHE_SIZE = 256
+_data_version = 0
+_response_cache: "OrderedDict[tuple, Any]" = OrderedDict()
+_response_cache_lock = Lock()
+# Токен процесса в ETag, чтобы версии разных запусков не совпадали
+_etag_prefix = uuid.uuid4().hex[:8]
+
+
+def invalidate_cache():
+    """Отметить данные как изменившиеся и сбросить кэш ответов"""
+    global _data_version
+    with _response_cache_lock:
+        _data_version += 1
+        _response_cache.clear()
+
+
+def cached(key: tuple, build: Callable[[], Any]) -> Any:
+    """Значение из кэша для текущей версии данных
+    
+    Args:
+        key: Ключ ответа (эндпоинт и параметры)
+        build: Строит значение при промахе; None не кэшируется
+    """
+    cache_key = (_data_version,) + key
+    with _response_cache_lock:
+        value = _response_cache.get(cache_key)
+        if value is not None:
+            _response_cache.move_to_end(cache_key)
+            return value
+    
+    value = build()
+    if value is None:
+        return None
+    with _response_cache_lock:
+        _response_cache[cache_key] = value
+        if len(_response_cache) > RESPONSE_CACHE_SIZE:
+            _response_cache.popitem(last=False)
+    return value
+
+
+def cached_json(key: tuple, build: Callable[[], Any]) -> Optional[bytes]:
+    """JSON ответа из кэша для текущей версии данных (build возвращает данные ответа или None)"""
+    def build_json():
+        data = build()
+        return None if data is None else orjson.dumps(data)
+    
+    return cached(key, build_json)
+
+
+def json_response(content: bytes, **kwargs) -> Response:
+    """Ответ с уже сериализованным JSON"""
+    return Response(content=content, media_type="application/json", **kwargs)
 
 
 # ========== API для терминов ==========
 
-@app.get("/api/terms", response_model=List[TermResponse], tags=["Термины"])
-async def get_terms(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Получить список всех терминов"""
-    terms = db.query(Term).offset(skip).limit(limit).all()
-    return terms
+def is_term_name_taken(db: Session, name: str, except_id: Optional[int] = None) -> bool:
+    """Проверка занятости названия через EXISTS по уникальному индексу, без загрузки строки"""
+    condition = Term.term == name
+    if except_id is not None:
+        condition = condition & (Term.id != except_id)
+    return db.scalar(select(exists().where(condition)))
+
+
+@app.get("/api/terms", response_model=List[TermSummary], tags=["Термины"])
+def get_terms(
+    skip: int = 0,
+    limit: int = 100,
+    after_id: Optional[int] = Query(None, description="Вернуть термины с ID больше указанного (постранично по ключу)"),
+    db: Session = Depends(get_db)
+):
+    """Получить список всех терминов (без определений, их возвращает GET /api/terms/{term_id})
+    
+    Предпочтительна постраничная выборка по ключу: передайте в after_id значение заголовка
+    X-Last-Id предыдущей страницы. В отличие от skip (OFFSET), она не перебирает пропущенные строки.
+    """
+    def build():
+        stmt = select(Term.id, Term.term, Term.node_type).order_by(Term.id).limit(limit)
+        if after_id is not None:
+            stmt = stmt.where(Term.id > after_id)
+        else:
+            stmt = stmt.offset(skip)
+        rows = db.execute(stmt).all()
+        page = [{"id": term_id, "term": term, "node_type": node_type} for term_id, term, node_type in rows]
+        return orjson.dumps(page), (rows[-1].id if rows else None)
+    
+    content, last_id = cached(("terms", skip, limit, after_id), build)
+    headers = {"X-Last-Id": str(last_id)} if last_id is not None else None
+    return json_response(content, headers=headers)
 
 
 @app.get("/api/terms/{term_id}", response_model=TermResponse, tags=["Термины"])
-async def get_term(term_id: int, db: Session = Depends(get_db)):
+def get_term(term_id: int, db: Session = Depends(get_db)):
     """Получить информацию о конкретном термине по ID"""
-    term = db.query(Term).filter(Term.id == term_id).first()
-    if not term:
+    def build():
+        term = db.get(Term, term_id)
+        return TermResponse.model_validate(term).model_dump() if term else None
+    
+    content = cached_json(("term", term_id), build)
+    if content is None:
         raise HTTPException(status_code=404, detail="Термин не найден")
-    return term
+    return json_response(content)
 
 
 @app.get("/api/terms/search/{keyword}", response_model=List[TermResponse], tags=["Термины"])
-async def search_term(keyword: str, db: Session = Depends(get_db)):
+def search_term(keyword: str, db: Session = Depends(get_db)):
     """Поиск терминов по ключевому слову"""
-    terms = db.query(Term).filter(
-        Term.term.contains(keyword) | Term.definition.contains(keyword)
-    ).all()
-    return terms
+    # Триграммный индекс не работает для запросов короче 3 символов
+    if len(keyword) < 3:
+        return db.query(Term).filter(
+            Term.term.contains(keyword) | Term.definition.contains(keyword)
+        ).all()
+    
+    # Полнотекстовый поиск по индексу terms_fts; ключевое слово ищется как фраза.
+    # bm25 с весами: совпадение в названии термина важнее совпадения в определении
+    phrase = '"' + keyword.replace('"', '""') + '"'
+    return db.query(Term).from_statement(text(
+        "SELECT terms.* FROM terms JOIN terms_fts ON terms_fts.rowid = terms.id "
+        "WHERE terms_fts MATCH :phrase ORDER BY bm25(terms_fts, 10.0, 1.0)"
+    )).params(phrase=phrase).all()
 
 
 @app.post("/api/terms", response_model=TermResponse, status_code=status.HTTP_201_CREATED, tags=["Термины"])
-async def create_term(term_data: TermCreate, db: Session = Depends(get_db)):
+def create_term(term_data: TermCreate, db: Session = Depends(get_db)):
     """Добавить новый термин"""
-    # Проверка на существование
-    existing = db.query(Term).filter(Term.term == term_data.term).first()
-    if existing:
+    # Проверка на существование (быстрый путь; гонки отсекает уникальный индекс)
+    if is_term_name_taken(db, term_data.term):
         raise HTTPException(status_code=400, detail="Термин уже существует")
     
     db_term = Term(term=term_data.term, definition=term_data.definition)
     db.add(db_term)
-    db.commit()
-    db.refresh(db_term)
-    return db_term
+    try:
+        # После flush ID уже известен: ответ собирается до коммита, без повторного SELECT
+        db.flush()
+        response = TermResponse.model_validate(db_term)
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Термин уже существует")
+    invalidate_cache()
+    return response
 
 
 @app.put("/api/terms/{term_id}", response_model=TermResponse, tags=["Термины"])
-async def update_term(term_id: int, term_data: TermUpdate, db: Session = Depends(get_db)):
+def update_term(term_id: int, term_data: TermUpdate, db: Session = Depends(get_db)):
     """Обновить существующий термин"""
-    term = db.query(Term).filter(Term.id == term_id).first()
+    term = db.get(Term, term_id)
     if not term:
         raise HTTPException(status_code=404, detail="Термин не найден")
     
     if term_data.term is not None:
         # Проверка на дубликат при изменении названия
-        existing = db.query(Term).filter(Term.term == term_data.term, Term.id != term_id).first()
-        if existing:
+        if is_term_name_taken(db, term_data.term, except_id=term_id):
             raise HTTPException(status_code=400, detail="Термин с таким названием уже существует")
         term.term = term_data.term
     
@@ -113,133 +239,140 @@ async def update_term(term_id: int, term_data: TermUpdate, db: Session = Depends
     if term_data.node_type is not None:
         term.node_type = term_data.node_type
     
-    db.commit()
-    db.refresh(term)
-    return term
+    try:
+        db.flush()
+        response = TermResponse.model_validate(term)
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Термин с таким названием уже существует")
+    invalidate_cache()
+    return response
 
 
 @app.delete("/api/terms/{term_id}", status_code=status.HTTP_204_NO_CONTENT, tags=["Термины"])
-async def delete_term(term_id: int, db: Session = Depends(get_db)):
+def delete_term(term_id: int, db: Session = Depends(get_db)):
     """Удалить термин"""
-    term = db.query(Term).filter(Term.id == term_id).first()
+    term = db.get(Term, term_id)
     if not term:
         raise HTTPException(status_code=404, detail="Термин не найден")
     
-    # Удаляем связанные связи
-    db.query(Link).filter(
-        (Link.source_id == term_id) | (Link.target_id == term_id)
-    ).delete()
-    
+    # Связи термина удаляются каскадно (ON DELETE CASCADE)
     db.delete(term)
     db.commit()
+    invalidate_cache()
     return None
 
 
 # ========== API для связей ==========
 
 @app.get("/api/links", response_model=List[LinkResponse], tags=["Связи"])
-async def get_links(db: Session = Depends(get_db)):
+def get_links(db: Session = Depends(get_db)):
     """Получить все связи между терминами"""
-    links = db.query(Link).all()
-    result = []
-    for link in links:
-        source_term = db.query(Term).filter(Term.id == link.source_id).first()
-        target_term = db.query(Term).filter(Term.id == link.target_id).first()
-        result.append(LinkResponse(
-            id=link.id,
-            source=source_term.term,
-            target=target_term.term,
-            relation=link.relation
-        ))
-    return result
+    # Получаем связи вместе с названиями терминов одним запросом
+    source_term = aliased(Term)
+    target_term = aliased(Term)
+    # Строки отдаются как есть: response_model проверяет их за один проход (from_attributes)
+    return (
+        db.query(Link.id, source_term.term.label("source"), target_term.term.label("target"), Link.relation)
+        .join(source_term, Link.source_id == source_term.id)
+        .join(target_term, Link.target_id == target_term.id)
+        .all()
+    )
 
 
 @app.post("/api/links", response_model=LinkResponse, status_code=status.HTTP_201_CREATED, tags=["Связи"])
-async def create_link(link_data: LinkCreate, db: Session = Depends(get_db)):
+def create_link(link_data: LinkCreate, db: Session = Depends(get_db)):
     """Создать связь между терминами"""
-    # Находим термины
-    source_term = db.query(Term).filter(Term.term == link_data.source).first()
-    target_term = db.query(Term).filter(Term.term == link_data.target).first()
+    # Находим оба термина одним запросом
+    terms = {
+        t.term: t
+        for t in db.query(Term).filter(Term.term.in_([link_data.source, link_data.target])).all()
+    }
+    source_term = terms.get(link_data.source)
+    target_term = terms.get(link_data.target)
     
     if not source_term:
         raise HTTPException(status_code=404, detail=f"Исходный термин '{link_data.source}' не найден")
     if not target_term:
         raise HTTPException(status_code=404, detail=f"Целевой термин '{link_data.target}' не найден")
     
-    # Проверка на дубликат
-    existing = db.query(Link).filter(
-        Link.source_id == source_term.id,
-        Link.target_id == target_term.id,
-        Link.relation == link_data.relation
-    ).first()
-    if existing:
-        raise HTTPException(status_code=400, detail="Такая связь уже существует")
-    
     db_link = Link(
         source_id=source_term.id,
         target_id=target_term.id,
         relation=link_data.relation
     )
     db.add(db_link)
-    db.commit()
-    db.refresh(db_link)
-    
-    return LinkResponse(
-        id=db_link.id,
-        source=source_term.term,
-        target=target_term.term,
-        relation=db_link.relation
-    )
+    try:
+        db.flush()
+        response = LinkResponse(
+            id=db_link.id,
+            source=link_data.source,
+            target=link_data.target,
+            relation=db_link.relation
+        )
+        db.commit()
+    except IntegrityError:
+        # Дубликат отсекается уникальным ограничением uq_link_triple
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Такая связь уже существует")
+    invalidate_cache()
+    return response
 
 
 @app.delete("/api/links/{link_id}", status_code=status.HTTP_204_NO_CONTENT, tags=["Связи"])
-async def delete_link(link_id: int, db: Session = Depends(get_db)):
+def delete_link(link_id: int, db: Session = Depends(get_db)):
     """Удалить связь"""
-    link = db.query(Link).filter(Link.id == link_id).first()
+    link = db.get(Link, link_id)
     if not link:
         raise HTTPException(status_code=404, detail="Связь не найдена")
     
     db.delete(link)
     db.commit()
+    invalidate_cache()
     return None
 
 
 # ========== API для графа ==========
 
+# Размер порции строк при чтении графа из БД
+GRAPH_YIELD_PER = 1000
+
+
 @app.get("/api/graph", response_model=GraphResponse, tags=["Граф"])
-async def get_graph(db: Session = Depends(get_db)):
+def get_graph(
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
     """Получить полный граф терминов для визуализации"""
-    terms = db.query(Term).all()
-    links = db.query(Link).all()
+    etag = f'"{_etag_prefix}-{_data_version}"'
+    if if_none_match == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
     
-    # Создаем узлы
-    nodes = [
-        GraphNode(
-            id=str(term.id),
-            label=term.term,
-            definition=term.definition,
-            node_type=term.node_type or 'term'
-        )
-        for term in terms
-    ]
-    
-    # Создаем ребра
-    edges = [
-        GraphEdge(
-            source=str(link.source_id),
-            target=str(link.target_id),
-            relation=link.relation
-        )
-        for link in links
-    ]
+    def build():
+        # Берем только нужные колонки и сериализуем обычные словари без Pydantic-моделей.
+        # Строки читаются порциями (yield_per), а не материализуются целиком
+        terms_stmt = select(Term.id, Term.term, Term.definition, Term.node_type)
+        links_stmt = select(Link.source_id, Link.target_id, Link.relation)
+        with db.execute(terms_stmt.execution_options(yield_per=GRAPH_YIELD_PER)) as terms:
+            nodes = [
+                {"id": str(term_id), "label": label, "definition": definition, "node_type": node_type or 'term'}
+                for term_id, label, definition, node_type in terms
+            ]
+        with db.execute(links_stmt.execution_options(yield_per=GRAPH_YIELD_PER)) as links:
+            edges = [
+                {"source": str(source_id), "target": str(target_id), "relation": relation}
+                for source_id, target_id, relation in links
+            ]
+        return {"nodes": nodes, "edges": edges}
     
-    return GraphResponse(nodes=nodes, edges=edges)
+    return json_response(cached_json(("graph",), build), headers={"ETag": etag})
 
 
 # ========== Утилиты ==========
 
 @app.post("/api/import", tags=["Утилиты"])
-async def import_data(reset: bool = False):
+def import_data(reset: bool = False):
     """Импорт данных из CSV файлов (ручной запуск)
     
     Args:
@@ -248,6 +381,7 @@ async def import_data(reset: bool = False):
     try:
         from app.import_data import main as import_main
         import_main(reset=reset)
+        invalidate_cache()
         return {"message": "Данные успешно импортированы"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка импорта: {str(e)}")
@@ -255,10 +389,15 @@ async def import_data(reset: bool = False):
 
 # ========== Фронтенд ==========
 
+INDEX_TEMPLATE_PATH = Path(__file__).parent / "templates" / "index.html"
+# Шаблон читается один раз при импорте; RELOAD_TEMPLATES=1 - перечитывать на каждый запрос (разработка)
+_index_html = INDEX_TEMPLATE_PATH.read_text(encoding="utf-8")
+
+
 @app.get("/", response_class=HTMLResponse, tags=["Фронтенд"])
 async def read_root():
     """Главная страница с визуализацией графа"""
-    template_path = Path(__file__).parent / "templates" / "index.html"
-    with open(template_path, "r", encoding="utf-8") as f:
-        return f.read()
-
+    content = _index_html
+    if os.getenv("RELOAD_TEMPLATES") == "1":
+        content = INDEX_TEMPLATE_PATH.read_text(encoding="utf-8")
+    return HTMLResponse(content=content, headers={"Cache-Control": "public, max-age=300"})
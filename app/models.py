@@ -2,9 +2,10 @@
 Модели базы данных для глоссария
 """
 import os
-from sqlalchemy import Column, Integer, String, ForeignKey, create_engine
+from sqlalchemy import Column, Integer, String, ForeignKey, UniqueConstraint, create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker
+from sqlalchemy.pool import QueuePool
 
 Base = declarative_base()
 
@@ -18,18 +19,28 @@ class Term(Base):
     definition = Column(String, nullable=False)
     node_type = Column(String, default='term', nullable=False)  # Тип узла: 'root', 'approach', 'term'
     
-    # Связи
-    source_links = relationship("Link", foreign_keys="Link.source_id", back_populates="source_term")
-    target_links = relationship("Link", foreign_keys="Link.target_id", back_populates="target_term")
+    # Связи (passive_deletes: при удалении термина связи не подгружаются,
+    # их удаляет БД каскадно)
+    source_links = relationship(
+        "Link", foreign_keys="Link.source_id", back_populates="source_term", passive_deletes=True
+    )
+    target_links = relationship(
+        "Link", foreign_keys="Link.target_id", back_populates="target_term", passive_deletes=True
+    )
 
 
 class Link(Base):
     """Модель связи между терминами"""
     __tablename__ = "links"
+    __table_args__ = (
+        # Дубликаты связей отсекаются на уровне БД
+        UniqueConstraint('source_id', 'target_id', 'relation', name='uq_link_triple'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    source_id = Column(Integer, ForeignKey("terms.id"), nullable=False)
-    target_id = Column(Integer, ForeignKey("terms.id"), nullable=False)
+    # При удалении термина его связи удаляет сама SQLite (ON DELETE CASCADE)
+    source_id = Column(Integer, ForeignKey("terms.id", ondelete="CASCADE"), nullable=False)
+    target_id = Column(Integer, ForeignKey("terms.id", ondelete="CASCADE"), nullable=False, index=True)
     relation = Column(String, nullable=False)
     
     # Связи
@@ -37,19 +48,55 @@ class Link(Base):
     target_term = relationship("Term", foreign_keys=[target_id], back_populates="target_links")
 
 
+class Meta(Base):
+    """Служебные значения БД (версия схемы и т.п.)"""
+    __tablename__ = "meta"
+    
+    key = Column(String, primary_key=True)
+    value = Column(String, nullable=False)
+
+
+# Версия схемы: увеличивается при добавлении новых миграций в init_db
+SCHEMA_VERSION = "4"
+
 # Настройка базы данных
 DB_PATH = os.getenv("DB_PATH", "./data/glossary.db")
 os.makedirs(os.path.dirname(DB_PATH) if os.path.dirname(DB_PATH) else ".", exist_ok=True)
 SQLALCHEMY_DATABASE_URL = f"sqlite:///{DB_PATH}"
+# Явный пул соединений: соединения (и настройки PRAGMA) переиспользуются между запросами
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, 
-    connect_args={"check_same_thread": False}
+    connect_args={"check_same_thread": False},
+    poolclass=QueuePool,
+    pool_size=5,
+    max_overflow=10,
+    echo_pool="debug" if os.getenv("SQLALCHEMY_ECHO_POOL") == "1" else False
 )
+
+
+@event.listens_for(engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Настройка SQLite при открытии соединения: WAL и меньше fsync на коммит"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-64000")
+    # Чтение страниц через mmap (до 256 МБ) вместо копирования в буфер процесса
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.close()
+
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
 def init_db():
     """Инициализация базы данных - создание таблиц и миграции"""
+    # Схема уже актуальна - пропускаем создание таблиц и интроспекцию
+    if get_schema_version() == SCHEMA_VERSION:
+        return
+    
     Base.metadata.create_all(bind=engine)
     
     # Миграция: добавление колонки node_type, если её нет
@@ -62,6 +109,93 @@ def init_db():
             conn.execute(text('ALTER TABLE terms ADD COLUMN node_type VARCHAR DEFAULT "term"'))
             conn.commit()
         print("Миграция: добавлена колонка node_type")
+    
+    # Миграция: каскадное удаление связей. Внешние ключи в SQLite не изменить через
+    # ALTER TABLE, поэтому таблица links пересоздается (висячие связи не переносятся)
+    link_fks = inspector.get_foreign_keys('links')
+    if any((fk.get('options') or {}).get('ondelete', '').upper() != 'CASCADE' for fk in link_fks):
+        with engine.begin() as conn:
+            conn.execute(text('ALTER TABLE links RENAME TO links_old'))
+            for index_name in ('ix_links_id', 'ix_links_target_id', 'uq_link_triple'):
+                conn.execute(text(f'DROP INDEX IF EXISTS {index_name}'))
+            Link.__table__.create(conn)
+            conn.execute(text(
+                'INSERT OR IGNORE INTO links (id, source_id, target_id, relation) '
+                'SELECT id, source_id, target_id, relation FROM links_old '
+                'WHERE source_id IN (SELECT id FROM terms) AND target_id IN (SELECT id FROM terms)'
+            ))
+            conn.execute(text('DROP TABLE links_old'))
+        inspector = inspect(engine)
+        print("Миграция: связи пересозданы с ON DELETE CASCADE")
+    
+    # Миграция: уникальность связи (source_id, target_id, relation) для старых БД
+    link_constraints = {uc['name'] for uc in inspector.get_unique_constraints('links')}
+    link_constraints |= {ix['name'] for ix in inspector.get_indexes('links')}
+    if 'uq_link_triple' not in link_constraints:
+        with engine.connect() as conn:
+            conn.execute(text(
+                'CREATE UNIQUE INDEX IF NOT EXISTS uq_link_triple ON links (source_id, target_id, relation)'
+            ))
+            conn.commit()
+        print("Миграция: добавлен уникальный индекс uq_link_triple")
+    
+    # Миграция: индекс по target_id (поиск по source_id покрывает uq_link_triple)
+    with engine.connect() as conn:
+        conn.execute(text('CREATE INDEX IF NOT EXISTS ix_links_target_id ON links (target_id)'))
+        conn.commit()
+    
+    # Миграция: полнотекстовый индекс FTS5 по терминам, синхронизируемый триггерами.
+    # Токенизатор trigram сохраняет поиск по подстроке (как LIKE '%kw%')
+    if 'terms_fts' not in inspector.get_table_names():
+        with engine.connect() as conn:
+            conn.execute(text(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS terms_fts USING fts5("
+                "term, definition, content='terms', content_rowid='id', tokenize='trigram')"
+            ))
+            conn.execute(text(
+                "CREATE TRIGGER IF NOT EXISTS terms_fts_ai AFTER INSERT ON terms BEGIN "
+                "INSERT INTO terms_fts (rowid, term, definition) VALUES (new.id, new.term, new.definition); "
+                "END"
+            ))
+            conn.execute(text(
+                "CREATE TRIGGER IF NOT EXISTS terms_fts_ad AFTER DELETE ON terms BEGIN "
+                "INSERT INTO terms_fts (terms_fts, rowid, term, definition) "
+                "VALUES ('delete', old.id, old.term, old.definition); "
+                "END"
+            ))
+            conn.execute(text(
+                "CREATE TRIGGER IF NOT EXISTS terms_fts_au AFTER UPDATE ON terms BEGIN "
+                "INSERT INTO terms_fts (terms_fts, rowid, term, definition) "
+                "VALUES ('delete', old.id, old.term, old.definition); "
+                "INSERT INTO terms_fts (rowid, term, definition) VALUES (new.id, new.term, new.definition); "
+                "END"
+            ))
+            # Индексируем уже существующие термины
+            conn.execute(text("INSERT INTO terms_fts (terms_fts) VALUES ('rebuild')"))
+            conn.commit()
+        print("Миграция: добавлен полнотекстовый индекс terms_fts")
+
+
+def get_schema_version():
+    """Версия схемы из таблицы meta (None, если БД еще не инициализирована)"""
+    from sqlalchemy import text
+    with engine.connect() as conn:
+        has_meta = conn.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'meta'"
+        )).first()
+        if not has_meta:
+            return None
+        return conn.execute(text("SELECT value FROM meta WHERE key = 'schema_version'")).scalar()
+
+
+def set_schema_version():
+    """Отметить, что схема и начальные данные соответствуют SCHEMA_VERSION"""
+    from sqlalchemy import text
+    with engine.begin() as conn:
+        conn.execute(
+            text("INSERT OR REPLACE INTO meta (key, value) VALUES ('schema_version', :value)"),
+            {"value": SCHEMA_VERSION}
+        )
 
 
 def get_db():
@@ -1,7 +1,7 @@
 """
 Pydantic схемы для валидации данных
 """
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional, List
 
 
@@ -28,8 +28,16 @@ class TermResponse(TermBase):
     """Схема ответа с термином"""
     id: int
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+
+
+class TermSummary(BaseModel):
+    """Краткая схема термина для списка (без определения)"""
+    id: int
+    term: str = Field(..., description="Название термина")
+    node_type: Optional[str] = Field('term', description="Тип узла: root, approach, term")
+    
+    model_config = ConfigDict(from_attributes=True)
 
 
 class LinkBase(BaseModel):
@@ -48,8 +56,7 @@ class LinkResponse(LinkBase):
     """Схема ответа со связью"""
     id: int
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class GraphNode(BaseModel):